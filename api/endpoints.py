@@ -10,6 +10,20 @@ from analytics.reports import top_sellers, average_lot_duration, payment_stats
 from db.models import get_lot_by_id, get_connection
 from uuid import uuid4
 from db.models import get_max_bid_for_lot
+from db.singleflight import get_coalesce_stats, forget, forget_all
+from db.models import get_all_users_json, get_user_bids_json
+from api.serialization import FastJSONResponse
+from core.config import FAST_SERIALIZATION
+from db.bid_sequencer import (
+    BidRejected,
+    SequencerOverloaded,
+    get_sequencer_stats,
+    is_hot,
+    mark_hot,
+    reload_lot,
+    submit_bid,
+    unmark_hot
+)
 from db.models import (
     get_top_sellers,
     get_lot_durations,
@@ -79,6 +93,9 @@ def api_get_users():
     """
     Возвращает список всех пользователей.
     """
+    if FAST_SERIALIZATION:
+        # JSON собирает Postgres, response_model не перепроверяет строки из БД
+        return FastJSONResponse(get_all_users_json())
     return get_all_users()
 
 @app.get("/users/{user_id}", response_model=UserModel)
@@ -99,6 +116,8 @@ def api_get_user_bids(user_id: str):
     user = get_user_by_id(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    if FAST_SERIALIZATION:
+        return FastJSONResponse(get_user_bids_json(user_id))
     bids = get_user_bids(user_id)
     return bids
 
@@ -140,6 +159,8 @@ def create_lot(lot: LotCreateModel, seller_id: str = Body(...)):
     conn.commit()
     cur.close()
     conn.close()
+    # Списки лотов, начатые до записи, не должны достаться новым запросам
+    forget_all(get_lots_with_sellers)
     return created_lot
 
 # ------------------- READ / GET Лот -------------------
@@ -173,6 +194,10 @@ def update_lot(lot_id: str, lot_update: LotUpdateModel):
     conn.commit()
     cur.close()
     conn.close()
+    forget(get_lot_by_id, lot_id)
+    forget_all(get_lots_with_sellers)
+    # Секвенсор горячего лота должен увидеть новую минимальную ставку
+    reload_lot(lot_id)
     return updated_lot
 
 # ------------------- DELETE Лот -------------------
@@ -188,10 +213,26 @@ def delete_lot(lot_id: str):
     conn.commit()
     cur.close()
     conn.close()
+    forget(get_lot_by_id, lot_id)
+    forget(get_bids_by_lot, lot_id)
+    forget_all(get_lots_with_sellers)
+    reload_lot(lot_id)
     return {"deleted_id": deleted["id"]}
 
 @app.post("/bids")
 def place_bid(bid: BidCreateModel):
+    # Горячий лот: ставка идёт через секвенсор, без гонки за строку лота в БД
+    if is_hot(bid.lot_id):
+        try:
+            new_bid = submit_bid(bid.lot_id, bid.bidder_id, bid.amount)
+        except BidRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        except SequencerOverloaded as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        # None — лот сняли с горячих, пока ставка шла; проводим её обычным путём
+        if new_bid is not None:
+            return new_bid
+
     # Проверка существования лота
     lot = get_lot_by_id(bid.lot_id)
     if not lot:
@@ -217,6 +258,9 @@ def place_bid(bid: BidCreateModel):
     conn.commit()
     cur.close()
     conn.close()
+    # Ставивший сразу после 200 должен увидеть свою ставку, а не склеенный старый запрос
+    forget(get_bids_by_lot, bid.lot_id)
+    forget_all(get_lots_with_sellers)
     return new_bid
 
 
@@ -233,3 +277,39 @@ def api_lot_durations():
 @app.get("/analytics/payment-stats", response_model=list[PaymentStatsModel])
 def api_payment_stats():
     return get_payment_stats()
+
+
+@app.get("/internal/coalesce-stats")
+def api_coalesce_stats():
+    """
+    Счётчики склейки одинаковых одновременных запросов к БД
+    """
+    return get_coalesce_stats()
+
+
+@app.put("/lots/{lot_id}/hot")
+def api_mark_lot_hot(lot_id: str):
+    """
+    Включает секвенсор ставок для лота
+    """
+    if not get_lot_by_id(lot_id):
+        raise HTTPException(status_code=404, detail="Lot not found")
+    mark_hot(lot_id)
+    return {"lot_id": lot_id, "hot": True}
+
+
+@app.delete("/lots/{lot_id}/hot")
+def api_unmark_lot_hot(lot_id: str):
+    """
+    Возвращает лот на обычный путь place_bid
+    """
+    unmark_hot(lot_id)
+    return {"lot_id": lot_id, "hot": False}
+
+
+@app.get("/internal/bid-sequencer-stats")
+def api_bid_sequencer_stats():
+    """
+    Счётчики секвенсора ставок: принятые, отклонённые, сброшенные, длины очередей
+    """
+    return get_sequencer_stats()
@@ -0,0 +1,14 @@
+from fastapi.responses import Response
+
+
+class FastJSONResponse(Response):
+    """
+    Отдаёт готовый JSON (например, из json_agg в Postgres) как есть:
+    без повторной валидации через response_model и без jsonable_encoder.
+    """
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return content.encode("utf-8")
@@ -0,0 +1,96 @@
+"""
+Бенчмарк всплеска ставок на один лот: обычный place_bid против секвенсора.
+
+Каждый поток шлёт ставки с растущей суммой, как в последние секунды аукциона.
+Отчёт: принятые ставки в секунду и p99 задержки одного вызова place_bid.
+
+ВНИМАНИЕ: ставки реально пишутся в таблицу bid — запускать на тестовой базе.
+
+Запуск из корня проекта:
+    python -m benchmarks.bid_burst_bench --lot-id <uuid> --bidder-id <uuid> --threads 64 --bids 2000
+"""
+import argparse
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from api.endpoints import place_bid
+from db.bid_sequencer import mark_hot, unmark_hot
+from db.models import get_max_bid_for_lot
+from db.schemas import BidCreateModel
+
+
+def run_burst(lot_id, bidder_id, threads, bids):
+    start_amount = float(get_max_bid_for_lot(lot_id) or 0) + 1
+    step = itertools.count()
+    step_lock = threading.Lock()
+    latencies = []
+    accepted = 0
+    rejected = 0
+    shed = 0
+    counters_lock = threading.Lock()
+
+    def one_bid(_):
+        nonlocal accepted, rejected, shed
+        with step_lock:
+            amount = start_amount + next(step)
+        bid = BidCreateModel(lot_id=lot_id, bidder_id=bidder_id, amount=amount)
+        t0 = time.perf_counter()
+        try:
+            place_bid(bid)
+            outcome = "accepted"
+        except HTTPException as e:
+            outcome = "shed" if e.status_code == 503 else "rejected"
+        except Exception:
+            # Обычный путь: ошибки блокировок/триггера из БД
+            outcome = "rejected"
+        elapsed = time.perf_counter() - t0
+        with counters_lock:
+            latencies.append(elapsed)
+            if outcome == "accepted":
+                accepted += 1
+            elif outcome == "shed":
+                shed += 1
+            else:
+                rejected += 1
+
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one_bid, range(bids)))
+    total = time.perf_counter() - t_start
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0
+    return {
+        "accepted_per_sec": accepted / total if total else 0,
+        "p99_ms": p99 * 1000,
+        "accepted": accepted,
+        "rejected": rejected,
+        "shed": shed,
+    }
+
+
+def report(mode, r):
+    print(f"{mode:<10} {r['accepted_per_sec']:>10,.0f} accepted/s   p99 {r['p99_ms']:>8.1f} ms   "
+          f"accepted={r['accepted']} rejected={r['rejected']} shed={r['shed']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Всплеск ставок на один лот")
+    parser.add_argument("--lot-id", required=True)
+    parser.add_argument("--bidder-id", required=True)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--bids", type=int, default=2000)
+    args = parser.parse_args()
+
+    unmark_hot(args.lot_id)
+    report("place_bid", run_burst(args.lot_id, args.bidder_id, args.threads, args.bids))
+
+    mark_hot(args.lot_id)
+    try:
+        report("sequencer", run_burst(args.lot_id, args.bidder_id, args.threads, args.bids))
+    finally:
+        unmark_hot(args.lot_id)
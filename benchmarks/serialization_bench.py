@@ -0,0 +1,68 @@
+"""
+Микро-бенчмарк сериализации списков: GET /users и GET /users/{id}/bids.
+
+Сравнивает оба пути целиком через Postgres:
+old — запрос + Python-цикл (для ставок) + валидация response_model
+      + jsonable_encoder + json.dumps (то, что делает FastAPI);
+new — запрос с json_agg, готовый JSON отдаётся как есть (как в эндпоинтах).
+
+Запуск из корня проекта:
+    python -m benchmarks.serialization_bench --user-id <uuid>
+"""
+import argparse
+import json
+import time
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from api.serialization import FastJSONResponse
+from db.models import get_all_users, get_all_users_json, get_user_bids, get_user_bids_json
+from db.schemas import UserModel, BidModel
+
+
+def old_render(adapter, content):
+    validated = adapter.validate_python(content)
+    encoded = jsonable_encoder(adapter.dump_python(validated, mode="json"))
+    return json.dumps(encoded, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def new_render(json_text):
+    return FastJSONResponse(json_text).body
+
+
+def measure(fn, rows, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return rows / best
+
+
+def report(endpoint, path, rows_per_sec):
+    print(f"{endpoint:<22} {path:<6} {rows_per_sec:>14,.0f} rows/s")
+
+
+def run(user_id, repeat):
+    users_adapter = TypeAdapter(List[UserModel])
+    n = len(get_all_users())
+    report("GET /users", "old", measure(lambda: old_render(users_adapter, get_all_users()), n, repeat))
+    report("GET /users", "new", measure(lambda: new_render(get_all_users_json()), n, repeat))
+
+    if user_id:
+        bids_adapter = TypeAdapter(List[BidModel])
+        n = len(get_user_bids(user_id)) or 1
+        report("GET /users/{id}/bids", "old", measure(lambda: old_render(bids_adapter, get_user_bids(user_id)), n, repeat))
+        report("GET /users/{id}/bids", "new", measure(lambda: new_render(get_user_bids_json(user_id)), n, repeat))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк сериализации списковых эндпоинтов")
+    parser.add_argument("--repeat", type=int, default=5, help="Повторов на замер (берётся лучший)")
+    parser.add_argument("--user-id", help="Пользователь для замера /users/{id}/bids")
+    args = parser.parse_args()
+
+    run(args.user_id, args.repeat)
@@ -9,3 +9,17 @@ DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
+
+# Склейка одинаковых одновременных запросов (db/singleflight.py)
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "1") != "0"
+COALESCE_TIMEOUT = float(os.getenv("COALESCE_TIMEOUT", "5"))
+
+# Быстрая сериализация списков: json_agg в Postgres + FastJSONResponse без повторной валидации
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "1") != "0"
+
+# Секвенсор ставок для горячих лотов (db/bid_sequencer.py)
+HOT_LOTS = [lot_id.strip() for lot_id in os.getenv("HOT_LOTS", "").split(",") if lot_id.strip()]
+BID_QUEUE_LIMIT = int(os.getenv("BID_QUEUE_LIMIT", "1000"))
+BID_BATCH_SIZE = int(os.getenv("BID_BATCH_SIZE", "50"))
+BID_WAIT_TIMEOUT = float(os.getenv("BID_WAIT_TIMEOUT", "2"))
+BID_SEQUENCER_IDLE = float(os.getenv("BID_SEQUENCER_IDLE", "30"))
@@ -0,0 +1,384 @@
+import queue
+import threading
+from decimal import Decimal, ROUND_HALF_UP
+from uuid import uuid4
+
+import psycopg2
+from psycopg2.errors import RaiseException
+from psycopg2.extras import execute_values
+
+from core.config import HOT_LOTS, BID_QUEUE_LIMIT, BID_BATCH_SIZE, BID_WAIT_TIMEOUT, BID_SEQUENCER_IDLE
+from db.connection import get_connection
+from db.models import get_bids_by_lot, get_lots_with_sellers
+from db.singleflight import forget, forget_all
+
+
+class BidRejected(Exception):
+    """
+    Ставка отклонена секвенсором (проиграла, лот не найден, ошибка БД).
+    """
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class SequencerOverloaded(Exception):
+    """
+    Очередь лота переполнена или ставка не дождалась обработки — load shedding.
+    """
+
+
+def _db_error(e, action):
+    # Текст ошибки драйвера клиенту не отдаём: 400 — только если виновата сама ставка
+    if isinstance(e, RaiseException):
+        return BidRejected(400, "Bid amount is less than minimum bet amount")
+    if isinstance(e, psycopg2.IntegrityError):
+        return BidRejected(400, "Bid refers to an unknown lot or bidder")
+    if isinstance(e, psycopg2.DataError):
+        return BidRejected(400, "Invalid bid data")
+    if isinstance(e, psycopg2.OperationalError):
+        return BidRejected(503, "Database is unavailable")
+    return BidRejected(500, f"Failed to {action}")
+
+
+def _money(value):
+    # Как NUMERIC(12,2) в таблице bid: иначе в памяти 150.004, а в БД 150.00
+    return Decimal(str(value)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+# ===== Счётчики =====
+_stats = {"accepted": 0, "rejected": 0, "shed": 0, "unconfirmed": 0, "batches": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(field, n=1):
+    with _stats_lock:
+        _stats[field] += n
+
+
+def get_sequencer_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    with _registry_lock:
+        stats["queues"] = {lot_id: s.queue.qsize() for lot_id, s in _sequencers.items()}
+        stats["hot_lots"] = sorted(_hot_lots)
+    return stats
+
+
+# ===== Горячие лоты =====
+# _hot_lots и _sequencers меняются только под _registry_lock
+_hot_lots = set(HOT_LOTS)
+_sequencers = {}
+# Снятые с реестра секвенсоры, которые ещё дописывают свою очередь
+_draining = {}
+_registry_lock = threading.Lock()
+
+
+def mark_hot(lot_id):
+    with _registry_lock:
+        _hot_lots.add(lot_id)
+        sequencer = _sequencers.get(lot_id)
+        if sequencer is not None:
+            sequencer.stale = True
+
+
+def unmark_hot(lot_id):
+    # Секвенсор снимаем с реестра: он дообработает уже принятые ставки и завершится.
+    # При повторном mark_hot будет создан новый, с максимумом из БД.
+    with _registry_lock:
+        _hot_lots.discard(lot_id)
+        sequencer = _sequencers.pop(lot_id, None)
+        if sequencer is not None:
+            _draining[lot_id] = sequencer
+    if sequencer is not None:
+        sequencer.stop()
+
+
+def is_hot(lot_id):
+    with _registry_lock:
+        return lot_id in _hot_lots
+
+
+def reload_lot(lot_id):
+    """
+    Перечитать лот и максимум из БД перед следующей пачкой
+    (после изменения лота в обход секвенсора).
+    """
+    with _registry_lock:
+        sequencer = _sequencers.get(lot_id)
+        if sequencer is not None:
+            sequencer.stale = True
+
+
+# ===== Ставка в очереди =====
+class _PendingBid:
+    def __init__(self, bidder_id, amount):
+        self.bid_id = str(uuid4())
+        self.bidder_id = bidder_id
+        self.amount = _money(amount)
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._state = "queued"  # queued -> claimed | cancelled
+
+    def claim(self):
+        with self._lock:
+            if self._state != "queued":
+                return False
+            self._state = "claimed"
+            return True
+
+    def cancel(self):
+        with self._lock:
+            if self._state != "queued":
+                return False
+            self._state = "cancelled"
+            return True
+
+    def resolve(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.done.set()
+
+
+# ===== Секвенсор лота =====
+class _LotSequencer:
+    """
+    Один поток на лот: сверяет ставки с максимумом в памяти и пишет
+    принятые небольшими пачками в одной транзакции.
+    """
+    def __init__(self, lot_id, previous=None):
+        self.lot_id = lot_id
+        # Предыдущий секвенсор лота, который ещё дописывает очередь: ждём его,
+        # иначе два потока пишут в один лот, а максимум прочитан до его записей
+        self.previous = previous
+        self.queue = queue.Queue(maxsize=BID_QUEUE_LIMIT)
+        self.min_amount = None
+        self.current_max = None
+        self.stale = True
+        self.stopping = False
+        self.thread = threading.Thread(target=self._run, name=f"bid-sequencer-{lot_id}", daemon=True)
+
+    def stop(self):
+        self.stale = True
+        self.stopping = True
+        try:
+            # Будим поток, если он ждёт в пустой очереди
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def _load_lot(self):
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT l.minimum_bet_amount, MAX(b.amount) AS max_bid
+            FROM lot l
+            LEFT JOIN bid b ON b.lot_id = l.id
+            WHERE l.id = %s
+            GROUP BY l.id;
+        """, (self.lot_id,))
+        row = cur.fetchone()
+        cur.close()
+        conn.close()
+        if not row:
+            return False
+        self.min_amount = row["minimum_bet_amount"]
+        self.current_max = row["max_bid"] or Decimal(0)
+        return True
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            with _registry_lock:
+                if _draining.get(self.lot_id) is self:
+                    del _draining[self.lot_id]
+
+    def _loop(self):
+        loaded = None
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            if self.previous is not None:
+                self.previous.thread.join()
+                self.previous = None
+            if not batch:
+                continue
+            if self.stale or loaded is not True:
+                # Лот и максимум читаем из БД при старте и после mark_hot/reload_lot/unmark_hot,
+                # при ошибке — повторяем на следующей пачке
+                self.stale = False
+                try:
+                    loaded = self._load_lot()
+                except Exception as e:
+                    loaded = e
+            if loaded is not True:
+                # Каждой ставке — свой объект ошибки: его поднимают в разных потоках
+                for pending in batch:
+                    pending.resolve(error=BidRejected(404, "Lot not found") if loaded is False
+                                    else _db_error(loaded, "load lot"))
+                _count("rejected", len(batch))
+                continue
+            try:
+                self._process(batch)
+            except Exception:
+                # Поток секвенсора не должен падать — иначе ставки повиснут
+                for pending in batch:
+                    if not pending.done.is_set():
+                        pending.resolve(error=BidRejected(500, "Bid sequencer error"))
+                        _count("rejected")
+
+    def _next_batch(self):
+        try:
+            if self.stopping:
+                # Снятый с реестра секвенсор только дочищает очередь
+                first = self.queue.get_nowait()
+            else:
+                first = self.queue.get(timeout=BID_SEQUENCER_IDLE)
+        except queue.Empty:
+            with _registry_lock:
+                # Под блокировкой реестра новых ставок в очередь не добавится
+                if self.queue.empty():
+                    if _sequencers.get(self.lot_id) is self:
+                        _sequencers.pop(self.lot_id)
+                    return None
+            first = self.queue.get_nowait()
+        items = [first]
+        while len(items) < BID_BATCH_SIZE:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        # None — сигнал stop(); ставки, которые вызывающий уже бросил по таймауту, не пишем
+        return [p for p in items if p is not None and p.claim()]
+
+    def _required(self, current_max):
+        return max(self.min_amount, current_max)
+
+    def _reject_low(self, pending, required):
+        pending.resolve(error=BidRejected(400, f"Bid amount must be at least {required}"))
+        _count("rejected")
+
+    def _process(self, batch):
+        # current_max — только записанные в БД ставки; поднимаем его лишь после успешной вставки
+        candidates = []
+        for pending in batch:
+            required = self._required(self.current_max)
+            if pending.amount < required:
+                # Проигрывает уже записанной ставке — отвечаем сразу, БД не трогаем
+                self._reject_low(pending, required)
+                continue
+            candidates.append(pending)
+        if not candidates:
+            return
+
+        # Внутри пачки ставка может проиграть только соседке, которая ещё не записана
+        tentative_max = self.current_max
+        accepted = []
+        outbid = []
+        for pending in candidates:
+            if pending.amount < self._required(tentative_max):
+                outbid.append(pending)
+                continue
+            tentative_max = pending.amount
+            accepted.append(pending)
+
+        _count("batches")
+        try:
+            rows = self._insert(accepted)
+        except Exception:
+            # Пачка откатилась — проверяем и пишем по одной, заново сверяясь с максимумом:
+            # ставки, перебитые незаписанной соседкой, получают второй шанс
+            self._process_one_by_one(candidates)
+            return
+
+        # Порядок RETURNING не гарантирован — сопоставляем по id, сгенерированному у нас
+        for pending in accepted:
+            row = rows[pending.bid_id]
+            self.current_max = max(self.current_max, row["amount"])
+            pending.resolve(result=row)
+            _count("accepted")
+        for pending in outbid:
+            self._reject_low(pending, self._required(self.current_max))
+
+    def _process_one_by_one(self, candidates):
+        for pending in candidates:
+            required = self._required(self.current_max)
+            if pending.amount < required:
+                self._reject_low(pending, required)
+                continue
+            try:
+                row = self._insert([pending])[pending.bid_id]
+            except Exception as e:
+                pending.resolve(error=_db_error(e, "place bid"))
+                _count("rejected")
+                continue
+            self.current_max = max(self.current_max, row["amount"])
+            pending.resolve(result=row)
+            _count("accepted")
+
+    def _insert(self, bids):
+        """
+        Пишет ставки одной транзакцией, возвращает {bid_id: строка из RETURNING}.
+        """
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            rows = execute_values(cur, """
+                INSERT INTO bid (id, lot_id, bidder_id, amount)
+                VALUES %s
+                RETURNING id, lot_id, bidder_id, amount, state, created_at;
+            """, [(p.bid_id, self.lot_id, p.bidder_id, p.amount) for p in bids],
+                page_size=len(bids), fetch=True)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+        # Читатели, пришедшие после записи, не должны присоединиться к старому запросу
+        forget(get_bids_by_lot, self.lot_id)
+        forget_all(get_lots_with_sellers)
+        return {str(row["id"]): row for row in rows}
+
+
+def submit_bid(lot_id, bidder_id, amount):
+    """
+    Ставит ставку в очередь секвенсора лота и ждёт результат.
+    Возвращает строку вставленной ставки, как place_bid, или None,
+    если лот уже не горячий — тогда ставку надо провести обычным путём.
+    Рассчитано на один процесс: максимум лота хранится в памяти.
+    """
+    pending = _PendingBid(bidder_id, amount)
+    with _registry_lock:
+        if lot_id not in _hot_lots:
+            # Лот сняли с горячих между is_hot и submit_bid
+            return None
+        sequencer = _sequencers.get(lot_id)
+        if sequencer is None:
+            sequencer = _LotSequencer(lot_id, previous=_draining.get(lot_id))
+            _sequencers[lot_id] = sequencer
+            sequencer.thread.start()
+        try:
+            sequencer.queue.put_nowait(pending)
+        except queue.Full:
+            _count("shed")
+            raise SequencerOverloaded(f"Bid queue for lot {lot_id} is full")
+
+    if not pending.done.wait(BID_WAIT_TIMEOUT):
+        if pending.cancel():
+            _count("shed")
+            raise SequencerOverloaded(f"Bid for lot {lot_id} was not processed in time")
+        # Ставка уже пишется в БД — ждём ещё не дольше BID_WAIT_TIMEOUT, поток не блокируем навсегда
+        if not pending.done.wait(BID_WAIT_TIMEOUT):
+            _count("unconfirmed")
+            raise BidRejected(500, f"Bid for lot {lot_id} was not confirmed in time, its outcome is unknown")
+
+    if pending.error is not None:
+        raise pending.error
+    return pending.result
@@ -1,4 +1,5 @@
 from db.connection import get_connection
+from db.singleflight import coalesce
 
 # ===== Лоты =====
 def get_all_lots():
@@ -16,6 +17,7 @@ def get_all_lots():
     return lots
 
 
+@coalesce
 def get_lots_with_sellers(
         state: str | list[str] | None = None,
         seller_id: str | None = None,
@@ -171,6 +173,7 @@ def get_payment_stats():
     return result
 
 
+@coalesce
 def get_lot_by_id(lot_id):
     conn = get_connection()
     cur = conn.cursor()
@@ -186,6 +189,7 @@ def get_lot_by_id(lot_id):
     return lot
 
 # ===== Ставки =====
+@coalesce
 def get_bids_by_lot(lot_id):
     conn = get_connection()
     cur = conn.cursor()
@@ -244,6 +248,75 @@ def get_all_users():
     conn.close()
     return users
 
+def _iso_datetime(column):
+    """
+    SQL-выражение: TIMESTAMPTZ в ISO-строку так же, как раньше писал Pydantic
+    для datetime из psycopg2: в часовом поясе сессии, смещение +03:00 или Z для UTC,
+    дробная часть из 6 цифр и без неё, если микросекунд нет.
+    """
+    return f"""
+        to_char({column}, CASE WHEN date_trunc('second', {column}) = {column}
+                               THEN 'YYYY-MM-DD"T"HH24:MI:SS'
+                               ELSE 'YYYY-MM-DD"T"HH24:MI:SS.US' END)
+        || CASE WHEN to_char({column}, 'TZH:TZM') = '+00:00'
+                THEN 'Z'
+                ELSE to_char({column}, 'TZH:TZM') END
+    """
+
+def get_all_users_json():
+    """
+    То же, что get_all_users, но JSON-массив собирает сам Postgres (json_agg).
+    Возвращает готовую строку JSON для быстрого пути сериализации.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    # birthday_date::timestamp — чтобы формат совпадал с UserModel (datetime)
+    cur.execute(f"""
+        SELECT COALESCE(json_agg(json_build_object(
+                   'id', id,
+                   'name', name,
+                   'surname', surname,
+                   'email', email,
+                   'phone_number', phone_number,
+                   'birthday_date', birthday_date::timestamp,
+                   'created_at', {_iso_datetime("created_at")}
+               ) ORDER BY created_at DESC), '[]')::text AS data
+        FROM "user";
+    """)
+    data = cur.fetchone()["data"]
+    cur.close()
+    conn.close()
+    return data
+
+def get_user_bids_json(user_id):
+    """
+    То же, что get_user_bids, но вложенную структуру и JSON собирает Postgres.
+    Возвращает готовую строку JSON для быстрого пути сериализации.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT COALESCE(json_agg(json_build_object(
+                   'bid_id', b.id,
+                   'amount', b.amount::float8,
+                   'state', b.state,
+                   'bid_created_at', {_iso_datetime("b.created_at")},
+                   'lot', json_build_object(
+                       'id', l.id,
+                       'name', l.name,
+                       'state', l.state,
+                       'minimum_bet_amount', l.minimum_bet_amount::float8
+                   )
+               ) ORDER BY b.created_at DESC), '[]')::text AS data
+        FROM bid b
+        JOIN lot l ON b.lot_id = l.id
+        WHERE b.bidder_id = %s;
+    """, (user_id,))
+    data = cur.fetchone()["data"]
+    cur.close()
+    conn.close()
+    return data
+
 def get_user_bids(user_id):
     """
     Возвращает все ставки пользователя с данными о лоте в формате dict.
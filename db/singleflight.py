@@ -0,0 +1,245 @@
+import asyncio
+import copy
+import functools
+import inspect
+import threading
+
+from core.config import COALESCE_ENABLED, COALESCE_TIMEOUT
+
+# ===== Счётчики =====
+# leader    — вызовы, которые реально сходили в БД
+# coalesced — вызовы, получившие результат чужого запроса
+# timeouts  — вызовы, не дождавшиеся лидера и выполнившие запрос сами
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _count(name, field):
+    with _stats_lock:
+        counters = _stats.setdefault(name, {"leader": 0, "coalesced": 0, "timeouts": 0})
+        counters[field] += 1
+
+
+def get_coalesce_stats():
+    """
+    Возвращает копию счётчиков склейки запросов по каждой функции.
+    """
+    with _stats_lock:
+        return {name: dict(counters) for name, counters in _stats.items()}
+
+
+def reset_coalesce_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _make_key(signature, args, kwargs):
+    # Ключ по связанным аргументам: f(x) и f(lot_id=x) — один и тот же запрос.
+    # list (например, state=["ACTIVE", "DRAFT"]) не хешируется — приводим к tuple
+    def freeze(value):
+        if isinstance(value, (list, tuple)):
+            return tuple(freeze(v) for v in value)
+        return value
+
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    key = tuple((k, freeze(v)) for k, v in bound.arguments.items())
+    hash(key)
+    return key
+
+
+class CoalescedError(Exception):
+    """
+    Ошибка общего запроса, которую не удалось скопировать для ожидающего.
+    """
+
+
+def _fresh_error(error):
+    # Каждый ожидающий получает свою копию: иначе raise дописывает кадры
+    # разных запросов в один общий __traceback__
+    try:
+        clone = copy.copy(error)
+    except Exception:
+        clone = None
+    if clone is None or clone is error or type(clone) is not type(error):
+        clone = CoalescedError(repr(error))
+    return clone
+
+
+# ===== Потоки =====
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok = False
+        self.result = None
+        self.error = None
+
+
+def _wrap_sync(func, name, timeout):
+    calls = {}
+    lock = threading.Lock()
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not COALESCE_ENABLED:
+            return func(*args, **kwargs)
+        try:
+            key = _make_key(signature, args, kwargs)
+        except TypeError:
+            return func(*args, **kwargs)
+
+        with lock:
+            call = calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                calls[key] = call
+
+        if not leader:
+            if call.done.wait(timeout):
+                if call.error is not None:
+                    _count(name, "coalesced")
+                    raise _fresh_error(call.error) from call.error
+                if call.ok:
+                    _count(name, "coalesced")
+                    return call.result
+                # Лидера прервали (KeyboardInterrupt и т.п.) — это не наша ошибка
+                return func(*args, **kwargs)
+            # Лидер завис — не ждём дольше timeout, идём в БД сами
+            _count(name, "timeouts")
+            return func(*args, **kwargs)
+
+        _count(name, "leader")
+        try:
+            call.result = func(*args, **kwargs)
+            call.ok = True
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with lock:
+                # После forget() ключ может принадлежать уже новому лидеру
+                if calls.get(key) is call:
+                    del calls[key]
+            call.done.set()
+        return call.result
+
+    def forget(*args, **kwargs):
+        with lock:
+            calls.pop(_make_key(signature, args, kwargs), None)
+
+    def forget_all():
+        with lock:
+            calls.clear()
+
+    wrapper.forget = forget
+    wrapper.forget_all = forget_all
+    return wrapper
+
+
+# ===== asyncio =====
+def _wrap_async(func, name, timeout):
+    # Future привязан к своему event loop, поэтому ключ включает loop
+    calls = {}
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not COALESCE_ENABLED:
+            return await func(*args, **kwargs)
+        try:
+            key = (id(asyncio.get_running_loop()), _make_key(signature, args, kwargs))
+        except TypeError:
+            return await func(*args, **kwargs)
+
+        future = calls.get(key)
+        if future is not None:
+            try:
+                # shield: отмена одного ожидающего не должна отменять общий запрос
+                result = await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                _count(name, "timeouts")
+                return await func(*args, **kwargs)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # отменили лидера, а не нас — выполняем запрос сами
+                return await func(*args, **kwargs)
+            except Exception as e:
+                _count(name, "coalesced")
+                raise _fresh_error(e) from e
+            _count(name, "coalesced")
+            return result
+
+        future = asyncio.get_running_loop().create_future()
+        calls[key] = future
+        _count(name, "leader")
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            future.set_exception(e)
+            # исключение уже проброшено лидеру — не ругаемся "never retrieved"
+            future.exception()
+            raise
+        except BaseException:
+            # Отмена и прочие BaseException не раздаются ожидающим — они повторят запрос сами
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if calls.get(key) is future:
+                del calls[key]
+
+    def forget(*args, **kwargs):
+        key = _make_key(signature, args, kwargs)
+        for loop_key in [k for k in calls if k[1] == key]:
+            calls.pop(loop_key, None)
+
+    def forget_all():
+        calls.clear()
+
+    wrapper.forget = forget
+    wrapper.forget_all = forget_all
+    return wrapper
+
+
+def forget(func, *args, **kwargs):
+    """
+    Убирает из склейки текущий запрос func(*args, **kwargs), как Group.Forget в Go.
+    Вызывать после commit записи: пришедшие позже пойдут в БД заново,
+    а не присоединятся к запросу, начатому до записи.
+    """
+    if hasattr(func, "forget"):
+        func.forget(*args, **kwargs)
+
+
+def forget_all(func):
+    """
+    То же, что forget, но для всех аргументов func (например, списки с фильтрами).
+    """
+    if hasattr(func, "forget_all"):
+        func.forget_all()
+
+
+def coalesce(func=None, *, timeout=None):
+    """
+    Склеивает одинаковые одновременные вызовы функции в один запрос к БД.
+
+    Первый вызов с данными аргументами выполняет запрос, остальные ждут
+    его результат не дольше timeout секунд, после чего выполняют запрос сами.
+    Результат общий для всех ожидающих — его нельзя изменять на месте.
+    Работает и для обычных функций (потоки), и для корутин (asyncio).
+    """
+    def decorator(f):
+        wait = COALESCE_TIMEOUT if timeout is None else timeout
+        name = f.__name__
+        if inspect.iscoroutinefunction(f):
+            return _wrap_async(f, name, wait)
+        return _wrap_sync(f, name, wait)
+
+    if func is not None:
+        return decorator(func)
+    return decorator
@@ -0,0 +1,321 @@
+import threading
+import time
+from decimal import Decimal
+
+import psycopg2
+import pytest
+
+import db.bid_sequencer as bs
+
+LOT = "lot-1"
+
+
+class FakeDB:
+    """
+    Таблица bid в памяти: NUMERIC(12,2), внешний ключ на bidder и отказ БД.
+    """
+    def __init__(self):
+        self.lot_exists = True
+        self.minimum = Decimal("100.00")
+        self.bids = []
+        self.inserts = 0
+        self.gate = None  # threading.Event: держит вставку, пока не выставлен
+        self.entered = threading.Event()
+        self.reverse_returning = True
+        self.down = False
+
+    def max_bid(self):
+        return max((b["amount"] for b in self.bids), default=None)
+
+    def insert(self, values):
+        self.inserts += 1
+        self.entered.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.down:
+            raise psycopg2.OperationalError("could not connect to server: secret-host:5432")
+        rows = []
+        for bid_id, lot_id, bidder_id, amount in values:
+            if bidder_id == "ghost":
+                raise psycopg2.IntegrityError('insert violates foreign key constraint "fk_bid_user"')
+            rows.append({"id": bid_id, "lot_id": lot_id, "bidder_id": bidder_id,
+                         "amount": Decimal(amount).quantize(Decimal("0.01")), "state": "PLACED"})
+        self.bids.extend(rows)
+        # Postgres не обещает порядок RETURNING
+        return list(reversed(rows)) if self.reverse_returning else rows
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, sql, params=None):
+        if self.db.down:
+            raise psycopg2.OperationalError("could not connect to server: secret-host:5432")
+
+    def fetchone(self):
+        if not self.db.lot_exists:
+            return None
+        return {"minimum_bet_amount": self.db.minimum, "max_bid": self.db.max_bid()}
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = FakeDB()
+    monkeypatch.setattr(bs, "get_connection", lambda: FakeConnection(db))
+    monkeypatch.setattr(bs, "execute_values", lambda cur, sql, values, **kw: cur.db.insert(values))
+    monkeypatch.setattr(bs, "BID_WAIT_TIMEOUT", 1.0)
+    monkeypatch.setattr(bs, "BID_SEQUENCER_IDLE", 0.2)
+    with bs._registry_lock:
+        bs._hot_lots.clear()
+        bs._sequencers.clear()
+        bs._draining.clear()
+    bs.mark_hot(LOT)
+    yield db
+    if db.gate is not None:
+        db.gate.set()
+    bs.unmark_hot(LOT)
+    for thread in threading.enumerate():
+        if thread.name.startswith("bid-sequencer-"):
+            thread.join(2)
+
+
+def outcome(bidder_id, amount):
+    try:
+        row = bs.submit_bid(LOT, bidder_id, amount)
+    except bs.BidRejected as e:
+        return e
+    except bs.SequencerOverloaded as e:
+        return e
+    return row
+
+
+def submit_async(results, key, bidder_id, amount):
+    thread = threading.Thread(target=lambda: results.__setitem__(key, outcome(bidder_id, amount)))
+    thread.start()
+    return thread
+
+
+def hold_sequencer(db, results):
+    """
+    Первая ставка занимает секвенсор на вставке, чтобы следующие попали в одну пачку.
+    """
+    db.gate = threading.Event()
+    thread = submit_async(results, "holder", "holder", 100)
+    assert db.entered.wait(2)
+    return thread
+
+
+def test_losing_bid_is_rejected_without_touching_db(fake_db):
+    assert outcome("alice", 200)["amount"] == Decimal("200.00")
+    inserts = fake_db.inserts
+
+    rejected = outcome("bob", 150)
+
+    assert isinstance(rejected, bs.BidRejected)
+    assert rejected.status_code == 400
+    assert rejected.detail == "Bid amount must be at least 200.00"
+    assert fake_db.inserts == inserts
+
+
+def test_batch_results_are_matched_by_id_not_by_order(fake_db):
+    results = {}
+    holder = hold_sequencer(fake_db, results)
+    threads = [submit_async(results, i, f"bidder-{i}", 200 + i) for i in range(5)]
+    time.sleep(0.1)
+    fake_db.gate.set()
+    for t in [holder] + threads:
+        t.join()
+
+    for i in range(5):
+        assert results[i]["bidder_id"] == f"bidder-{i}"
+        assert results[i]["amount"] == Decimal(200 + i)
+
+
+def test_failing_high_bid_does_not_block_valid_bids_in_same_batch(fake_db):
+    results = {}
+    holder = hold_sequencer(fake_db, results)
+    threads = [submit_async(results, "ghost", "ghost", 1e9)]
+    time.sleep(0.05)
+    for amount in (150, 151, 152):
+        threads.append(submit_async(results, amount, "alice", amount))
+        time.sleep(0.02)
+    fake_db.gate.set()
+    for t in [holder] + threads:
+        t.join()
+
+    assert results["ghost"].status_code == 400
+    assert "fk_bid_user" not in results["ghost"].detail
+    for amount in (150, 151, 152):
+        assert results[amount]["amount"] == Decimal(amount)
+    assert fake_db.max_bid() == Decimal("152.00")
+
+
+def test_database_outage_is_503_without_driver_text(fake_db):
+    assert outcome("alice", 150)["amount"] == Decimal("150.00")
+    fake_db.down = True
+
+    error = outcome("bob", 200)
+
+    assert error.status_code == 503
+    assert "secret-host" not in error.detail
+
+
+def test_lot_load_failure_does_not_leak_driver_text(fake_db):
+    fake_db.down = True
+
+    error = outcome("alice", 150)
+
+    assert error.status_code == 503
+    assert "secret-host" not in error.detail
+
+
+def test_not_found_errors_are_separate_objects(fake_db):
+    fake_db.lot_exists = False
+    results = {}
+    threads = [submit_async(results, i, "alice", 150) for i in range(3)]
+    for t in threads:
+        t.join()
+
+    assert all(r.status_code == 404 for r in results.values())
+    assert len({id(r) for r in results.values()}) == 3
+
+
+def test_amounts_are_rounded_like_numeric_column(fake_db):
+    assert outcome("alice", 150.004)["amount"] == Decimal("150.00")
+
+    # Тот же NUMERIC(12,2) в БД — ставка 150.00 равна максимуму и проходит, как в place_bid
+    assert outcome("bob", 150.00)["amount"] == Decimal("150.00")
+
+
+def test_remark_reloads_max_written_while_lot_was_not_hot(fake_db):
+    assert outcome("alice", 150)["amount"] == Decimal("150.00")
+    bs.unmark_hot(LOT)
+    fake_db.bids.append({"id": "direct", "amount": Decimal("500.00")})
+    bs.mark_hot(LOT)
+
+    error = outcome("bob", 300)
+
+    assert error.status_code == 400
+    assert error.detail == "Bid amount must be at least 500.00"
+
+
+def test_reload_lot_picks_up_new_minimum(fake_db):
+    assert outcome("alice", 150)["amount"] == Decimal("150.00")
+    fake_db.minimum = Decimal("1000.00")
+    bs.reload_lot(LOT)
+
+    error = outcome("bob", 300)
+
+    assert error.detail == "Bid amount must be at least 1000.00"
+
+
+def test_new_sequencer_waits_for_draining_one(fake_db):
+    results = {}
+    fake_db.gate = threading.Event()
+    old = submit_async(results, "old", "alice", 500)
+    assert fake_db.entered.wait(2)
+
+    # Старый секвенсор держит ставку 500 на вставке; лот снимают и снова делают горячим
+    bs.unmark_hot(LOT)
+    bs.mark_hot(LOT)
+    new = submit_async(results, "new", "bob", 300)
+    time.sleep(0.1)
+    fake_db.gate.set()
+    old.join()
+    new.join()
+
+    assert results["old"]["amount"] == Decimal("500.00")
+    assert results["new"].status_code == 400
+    assert [b["amount"] for b in fake_db.bids] == [Decimal("500.00")]
+
+
+def test_claimed_bid_wait_is_bounded(fake_db):
+    fake_db.gate = threading.Event()
+    start = time.monotonic()
+
+    error = outcome("alice", 150)
+
+    assert isinstance(error, bs.BidRejected)
+    assert error.status_code == 500
+    assert time.monotonic() - start < 3
+    assert bs.get_sequencer_stats()["unconfirmed"] >= 1
+
+
+def test_full_queue_sheds_load(fake_db, monkeypatch):
+    monkeypatch.setattr(bs, "BID_QUEUE_LIMIT", 1)
+    bs.unmark_hot(LOT)
+    bs.mark_hot(LOT)
+    results = {}
+    holder = hold_sequencer(fake_db, results)
+    queued = submit_async(results, "queued", "bob", 200)
+    time.sleep(0.05)
+
+    assert isinstance(outcome("carol", 300), bs.SequencerOverloaded)
+
+    fake_db.gate.set()
+    holder.join()
+    queued.join()
+
+
+def test_not_hot_lot_falls_back_to_normal_path(fake_db):
+    bs.unmark_hot(LOT)
+
+    assert bs.submit_bid(LOT, "alice", 150) is None
+
+
+def test_idle_sequencer_shuts_down(fake_db):
+    outcome("alice", 150)
+    time.sleep(0.5)
+
+    assert LOT not in bs.get_sequencer_stats()["queues"]
+    assert not [t for t in threading.enumerate() if t.name == f"bid-sequencer-{LOT}"]
+
+
+def test_insert_forgets_in_flight_bid_reads(fake_db, monkeypatch):
+    forgotten = []
+    monkeypatch.setattr(bs, "forget", lambda func, *args: forgotten.append((func.__name__, args)))
+
+    outcome("alice", 150)
+
+    assert ("get_bids_by_lot", (LOT,)) in forgotten
+
+
+def test_stats_survive_concurrent_mark_unmark(fake_db):
+    stop = threading.Event()
+
+    def flip():
+        i = 0
+        while not stop.is_set():
+            bs.mark_hot(f"other-{i % 50}")
+            bs.unmark_hot(f"other-{(i + 25) % 50}")
+            i += 1
+
+    thread = threading.Thread(target=flip)
+    thread.start()
+    try:
+        for _ in range(500):
+            bs.get_sequencer_stats()
+    finally:
+        stop.set()
+        thread.join()
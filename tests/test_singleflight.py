@@ -0,0 +1,246 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from db.singleflight import coalesce, forget, get_coalesce_stats, reset_coalesce_stats
+
+
+@pytest.fixture(autouse=True)
+def clean_stats():
+    reset_coalesce_stats()
+    yield
+    reset_coalesce_stats()
+
+
+def run_threads(target, n, *args):
+    results = [None] * n
+
+    def worker(i):
+        try:
+            results[i] = target(*args)
+        except BaseException as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    return threads, results
+
+
+def test_identical_calls_share_one_execution():
+    calls = []
+    release = threading.Event()
+
+    @coalesce
+    def query(lot_id):
+        calls.append(lot_id)
+        release.wait(2)
+        return [{"id": lot_id}]
+
+    threads, results = run_threads(query, 10, "L1")
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert calls == ["L1"]
+    assert all(r == [{"id": "L1"}] for r in results)
+    assert get_coalesce_stats()["query"] == {"leader": 1, "coalesced": 9, "timeouts": 0}
+
+
+def test_positional_and_keyword_arguments_share_key():
+    release = threading.Event()
+    calls = []
+
+    @coalesce
+    def query(lot_id, state=None):
+        calls.append(lot_id)
+        release.wait(2)
+        return lot_id
+
+    leader = threading.Thread(target=query, args=("L1",))
+    leader.start()
+    time.sleep(0.05)
+    follower = threading.Thread(target=query, kwargs={"lot_id": "L1", "state": None})
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    follower.join()
+
+    assert calls == ["L1"]
+
+
+def test_follower_runs_query_itself_after_timeout():
+    release = threading.Event()
+    calls = []
+
+    @coalesce(timeout=0.05)
+    def query(lot_id):
+        calls.append(threading.current_thread().name)
+        if len(calls) == 1:
+            release.wait(2)
+        return lot_id
+
+    leader = threading.Thread(target=query, args=("L1",))
+    leader.start()
+    time.sleep(0.02)
+    assert query("L1") == "L1"
+    release.set()
+    leader.join()
+
+    assert len(calls) == 2
+    assert get_coalesce_stats()["query"]["timeouts"] == 1
+
+
+def test_followers_get_their_own_copy_of_the_error():
+    release = threading.Event()
+
+    @coalesce
+    def query(lot_id):
+        release.wait(2)
+        raise ValueError("db is down")
+
+    threads, results = run_threads(query, 5, "L1")
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len({id(r) for r in results}) == 5
+    leader_errors = [r for r in results if r.__cause__ is None]
+    assert len(leader_errors) == 1
+    assert all(r.__cause__ is leader_errors[0] for r in results if r is not leader_errors[0])
+
+
+def test_base_exception_of_leader_is_not_shared():
+    release = threading.Event()
+    calls = []
+
+    @coalesce
+    def query(lot_id):
+        calls.append(lot_id)
+        if len(calls) == 1:
+            release.wait(2)
+            raise KeyboardInterrupt
+        return lot_id
+
+    threads, results = run_threads(query, 3, "L1")
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert sum(isinstance(r, KeyboardInterrupt) for r in results) == 1
+    assert results.count("L1") == 2
+
+
+def test_forget_makes_later_callers_start_a_fresh_query():
+    old_release = threading.Event()
+    data = {"bids": ["old"]}
+    calls = []
+
+    @coalesce
+    def query(lot_id):
+        snapshot = list(data["bids"])
+        calls.append(snapshot)
+        if len(calls) == 1:
+            old_release.wait(2)
+        return snapshot
+
+    stale = threading.Thread(target=query, args=("L1",))
+    stale.start()
+    time.sleep(0.05)
+
+    # Запись закоммичена — забываем запрос, начатый до неё
+    data["bids"].append("new")
+    forget(query, "L1")
+    assert query("L1") == ["old", "new"]
+
+    old_release.set()
+    stale.join()
+    assert len(calls) == 2
+
+
+def test_finished_old_leader_does_not_drop_new_leader_key():
+    old_release = threading.Event()
+    new_release = threading.Event()
+    calls = []
+
+    @coalesce
+    def query(lot_id):
+        calls.append(lot_id)
+        (old_release if len(calls) == 1 else new_release).wait(2)
+        return len(calls)
+
+    old = threading.Thread(target=query, args=("L1",))
+    old.start()
+    time.sleep(0.05)
+    forget(query, "L1")
+    new = threading.Thread(target=query, args=("L1",))
+    new.start()
+    time.sleep(0.05)
+    old_release.set()
+    old.join()
+
+    # Новый лидер ещё в работе — следующий вызов должен к нему присоединиться
+    follower_threads, results = run_threads(query, 1, "L1")
+    time.sleep(0.05)
+    new_release.set()
+    new.join()
+    follower_threads[0].join()
+    assert len(calls) == 2
+
+
+def test_async_calls_share_one_execution():
+    calls = []
+
+    @coalesce
+    async def query(lot_id):
+        calls.append(lot_id)
+        await asyncio.sleep(0.05)
+        return lot_id
+
+    async def main():
+        return await asyncio.gather(*[query("L1") for _ in range(5)])
+
+    assert asyncio.run(main()) == ["L1"] * 5
+    assert calls == ["L1"]
+    assert get_coalesce_stats()["query"] == {"leader": 1, "coalesced": 4, "timeouts": 0}
+
+
+def test_async_followers_rerun_when_leader_is_cancelled():
+    calls = []
+
+    @coalesce
+    async def query(lot_id):
+        calls.append(lot_id)
+        await asyncio.sleep(0.05)
+        return lot_id
+
+    async def main():
+        leader = asyncio.ensure_future(query("L1"))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(query("L1")) for _ in range(2)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await asyncio.gather(*followers)
+
+    assert asyncio.run(main()) == ["L1", "L1"]
+    assert len(calls) >= 2
+
+
+def test_async_follower_timeout():
+    @coalesce(timeout=0.01)
+    async def query(lot_id):
+        await asyncio.sleep(0.05)
+        return lot_id
+
+    async def main():
+        return await asyncio.gather(*[query("L1") for _ in range(3)])
+
+    assert asyncio.run(main()) == ["L1"] * 3
+    assert get_coalesce_stats()["query"]["timeouts"] == 2